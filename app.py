@@ -9,9 +9,13 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import date, timedelta, datetime
-from typing import Dict, Any, Tuple, Optional
+from datetime import date, datetime
+from typing import Dict, Any, Tuple, Optional, Iterator
 import json
+import hashlib
+import itertools
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 
 # ==========================================
 # IMPORTS (Conditional for graceful degradation)
@@ -24,10 +28,17 @@ except ImportError:
 
 try:
     from supabase import create_client, Client
+    from postgrest.exceptions import APIError
     SUPABASE_AVAILABLE = True
 except ImportError:
     SUPABASE_AVAILABLE = False
 
+try:
+    import numexpr as ne
+    NUMEXPR_AVAILABLE = True
+except ImportError:
+    NUMEXPR_AVAILABLE = False
+
 # ==========================================
 # PAGE CONFIGURATION
 # ==========================================
@@ -80,6 +91,26 @@ st.markdown("""
         color: #10b981;
         font-weight: bold;
     }
+    .kpi-row {
+        display: flex;
+        gap: 1rem;
+    }
+    .kpi-tile {
+        flex: 1;
+        min-width: 0;
+    }
+    .kpi-label {
+        font-size: 0.875rem;
+        color: #6b7280;
+    }
+    .kpi-value {
+        font-size: 1.75rem;
+        white-space: nowrap;
+    }
+    .kpi-delta {
+        font-size: 0.875rem;
+        color: #6b7280;
+    }
 </style>
 """, unsafe_allow_html=True)
 
@@ -120,17 +151,20 @@ def login_user(email: str, password: str) -> Tuple[bool, Optional[str]]:
         })
 
         if response.user:
-            # Store user info in session
-            st.session_state.user = response.user
-            st.session_state.user_email = response.user.email
-            st.session_state.authenticated = True
+            # Collect user info for the session
+            auth = {
+                'user': response.user,
+                'user_email': response.user.email
+            }
 
             # Get user profile
             profile = supabase.table('user_profiles').select('*').eq('id', response.user.id).execute()
             if profile.data:
-                st.session_state.user_role = profile.data[0]['role']
-                st.session_state.company_id = profile.data[0]['company_id']
+                auth['user_role'] = profile.data[0]['role']
+                auth['company_id'] = profile.data[0]['company_id']
 
+            # A single 'auth' entry marks the session as authenticated
+            st.session_state.auth = auth
             return True, None
         return False, "Invalid credentials"
     except Exception as e:
@@ -188,109 +222,158 @@ def logout_user():
             pass
 
     # Clear session
-    for key in ['user', 'user_email', 'authenticated', 'user_role', 'company_id']:
-        if key in st.session_state:
-            del st.session_state[key]
+    st.session_state.pop('auth', None)
 
 # ==========================================
 # DATA GENERATION & LOADING
 # ==========================================
-def get_default_transactions(company_id: Optional[str] = None) -> pd.DataFrame:
-    """Generate default 13-week transaction data"""
-    dates = [date.today() + timedelta(weeks=i) for i in range(13)]
-    data = []
-
-    for i, d in enumerate(dates):
-        # Weekly sales revenue
-        data.append({
-            "company_id": company_id,
-            "transaction_date": d,
-            "category": "Sales Revenue",
-            "type": "Inflow",
-            "amount": 45000 + np.random.randint(-5000, 5000),
-            "description": "Weekly sales"
-        })
+TRANSACTION_TYPE_DTYPE = pd.CategoricalDtype(['Inflow', 'Outflow'])
 
-        # Customer payments (AR collections)
-        if i % 2 == 0:
-            data.append({
-                "company_id": company_id,
-                "transaction_date": d,
-                "category": "AR Collections",
-                "type": "Inflow",
-                "amount": 25000 + np.random.randint(-3000, 3000),
-                "description": "Customer payments"
-            })
-
-        # Operating expenses
-        data.append({
-            "company_id": company_id,
-            "transaction_date": d,
-            "category": "Operating Expenses",
-            "type": "Outflow",
-            "amount": 12000 + np.random.randint(-2000, 2000),
-            "description": "Weekly OPEX"
-        })
-
-        # Payroll (bi-weekly)
-        if i % 2 == 0:
-            data.append({
-                "company_id": company_id,
-                "transaction_date": d,
-                "category": "Payroll",
-                "type": "Outflow",
-                "amount": 38000 + np.random.randint(-2000, 2000),
-                "description": "Bi-weekly payroll"
-            })
-
-        # Vendor payments (weekly)
-        data.append({
-            "company_id": company_id,
-            "transaction_date": d,
-            "category": "Vendor Payments",
-            "type": "Outflow",
-            "amount": 8000 + np.random.randint(-1000, 1000),
-            "description": "Supplier payments"
-        })
+def _normalize_transaction_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast label columns to categoricals and amounts to float64 (in place)"""
+    df['type'] = df['type'].astype(TRANSACTION_TYPE_DTYPE)
+    df['category'] = df['category'].astype('category')
+    # float64, not float32: float32 can't hold cents on six-figure amounts (999999.99 -> 1e6)
+    df['amount'] = df['amount'].astype(np.float64)
+    return df
 
-        # Rent (monthly - week 0, 4, 8, 12)
-        if i % 4 == 0:
-            data.append({
-                "company_id": company_id,
-                "transaction_date": d,
-                "category": "Rent",
-                "type": "Outflow",
-                "amount": 15000,
-                "description": "Monthly rent"
-            })
+@st.cache_data(ttl=3600, show_spinner=False)
+def get_default_transactions(company_id: Optional[str] = None) -> pd.DataFrame:
+    """Generate default 13-week transaction data"""
+    # Seed from company_id so the cached frame is deterministic per company
+    rng = np.random.default_rng(zlib.crc32(str(company_id).encode()))
+    weeks = np.arange(13)
+    dates = pd.Timestamp(date.today()) + pd.to_timedelta(weeks * 7, unit='D')
+
+    # (category, type, base amount, +/- noise, every N weeks, description)
+    schedule = [
+        ("Sales Revenue", "Inflow", 45000, 5000, 1, "Weekly sales"),
+        ("AR Collections", "Inflow", 25000, 3000, 2, "Customer payments"),
+        ("Operating Expenses", "Outflow", 12000, 2000, 1, "Weekly OPEX"),
+        ("Payroll", "Outflow", 38000, 2000, 2, "Bi-weekly payroll"),
+        ("Vendor Payments", "Outflow", 8000, 1000, 1, "Supplier payments"),
+        ("Rent", "Outflow", 15000, 0, 4, "Monthly rent"),  # weeks 0, 4, 8, 12
+    ]
+
+    categories, flow_types, bases, noises, periods, descriptions = zip(*schedule)
+    week_idx = [np.flatnonzero(weeks % every == 0) for every in periods]
+    counts = [idx.size for idx in week_idx]
+    amounts = [
+        base + rng.integers(-noise, noise, size=n) if noise else np.full(n, base)
+        for base, noise, n in zip(bases, noises, counts)
+    ]
+
+    # One constructor over concatenated column arrays
+    return _normalize_transaction_dtypes(pd.DataFrame({
+        "company_id": company_id,
+        "transaction_date": dates[np.concatenate(week_idx)],
+        "category": np.repeat(categories, counts),
+        "type": np.repeat(flow_types, counts),
+        "amount": np.concatenate(amounts),
+        "description": np.repeat(descriptions, counts)
+    }))
+
+# PostgREST's "function not found" error (a bare 404 if the body isn't JSON)
+RPC_NOT_FOUND_CODES = ('PGRST202', 404, '404')
+
+def save_transactions_bulk(company_id: str, transactions_df: pd.DataFrame):
+    """Insert transactions as a column-oriented payload via the bulk_insert_transactions RPC"""
+    columns = {
+        'transaction_date': transactions_df['transaction_date'].dt.strftime('%Y-%m-%d').tolist(),
+        'category': transactions_df['category'].astype(str).tolist(),
+        'type': transactions_df['type'].astype(str).tolist(),
+        'amount': transactions_df['amount'].tolist(),
+        'description': transactions_df['description'].tolist()
+    }
 
-    return pd.DataFrame(data)
+    try:
+        supabase.rpc('bulk_insert_transactions', {
+            'p_company_id': company_id,
+            **{f'p_{name}': values for name, values in columns.items()}
+        }).execute()
+    except APIError as e:
+        # Anything other than "RPC not deployed" (migration 007) is a real failure
+        if e.code not in RPC_NOT_FOUND_CODES:
+            raise
+
+        # Fall back to a row-oriented insert
+        records = [
+            dict(zip(columns, row), company_id=company_id)
+            for row in zip(*columns.values())
+        ]
+        supabase.table('transactions').insert(records).execute()
+
+# Only the columns the forecast/anomaly pipeline reads
+TRANSACTION_COLUMNS = "id, transaction_date, category, type, amount, description"
+# PostgREST caps responses (1000 rows by default), so larger histories are paged
+SUPABASE_PAGE_SIZE = 1000
+
+def fetch_transaction_rows(company_id: str) -> list:
+    """Fetch a company's transactions page by page with a projected column list"""
+    rows = []
+    while True:
+        page = (
+            supabase.table('transactions')
+            .select(TRANSACTION_COLUMNS)
+            .eq('company_id', company_id)
+            .order('transaction_date')
+            .order('id')
+            .range(len(rows), len(rows) + SUPABASE_PAGE_SIZE - 1)
+            .execute()
+        )
+        # The server's max-rows cap may be below SUPABASE_PAGE_SIZE, so a short
+        # page doesn't mean the end; only an empty one does
+        if not page.data:
+            return rows
+        rows.extend(page.data)
 
 def load_transactions(company_id: str) -> pd.DataFrame:
-    """Load transactions from Supabase or return default data"""
+    """Load transactions from Supabase or return default data (dates as datetime64)"""
     if not supabase or not company_id:
         return get_default_transactions()
 
     try:
-        response = supabase.table('transactions').select('*').eq('company_id', company_id).execute()
+        rows = fetch_transaction_rows(company_id)
 
-        if response.data and len(response.data) > 0:
-            df = pd.DataFrame(response.data)
-            df['transaction_date'] = pd.to_datetime(df['transaction_date']).dt.date
-            return df
+        if rows:
+            df = pd.DataFrame(rows)
+            # Supabase returns DATE columns as ISO strings; skip per-row format inference
+            df['transaction_date'] = pd.to_datetime(df['transaction_date'], format='%Y-%m-%d', cache=True)
+            return _normalize_transaction_dtypes(df)
         else:
             # No data, create and save defaults
             default_data = get_default_transactions(company_id)
-            # Save to DB
-            records = default_data.to_dict('records')
-            for record in records:
-                record['transaction_date'] = record['transaction_date'].isoformat()
-            supabase.table('transactions').insert(records).execute()
+            save_transactions_bulk(company_id, default_data)
             return default_data
     except Exception as e:
         st.warning(f"Could not load transactions: {e}")
         return get_default_transactions(company_id)
 
+@st.cache_resource
+def get_dashboard_executor() -> ThreadPoolExecutor:
+    """Worker pool shared across reruns and sessions for independent data computations"""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="dashboard")
+
+@st.cache_data(ttl=300, show_spinner=False, max_entries=32)
+def load_transaction_snapshot(company_id: str) -> Dict[str, Any]:
+    """
+    Load a company's transactions once and derive everything the dashboard needs from them
+
+    Weekly flows, payroll weeks and anomalies all come from the same load,
+    so they can't drift apart when the cache entry expires.
+
+    Returns:
+        get_weekly_base_flows() output plus 'anomalies' (detect_anomalies() output)
+    """
+    transactions_df = load_transactions(company_id)
+
+    # Anomaly detection is independent of the weekly bucketing, so run it alongside
+    anomalies_future = get_dashboard_executor().submit(detect_anomalies, transactions_df)
+    snapshot = get_weekly_base_flows(transactions_df)
+    snapshot['anomalies'] = anomalies_future.result()
+    return snapshot
+
+@st.cache_data(ttl=300, show_spinner=False)
 def get_company_settings(company_id: str) -> Dict[str, Any]:
     """Load company settings from Supabase"""
     if not supabase or not company_id:
@@ -302,7 +385,13 @@ def get_company_settings(company_id: str) -> Dict[str, Any]:
         }
 
     try:
-        response = supabase.table('companies').select('*').eq('id', company_id).single().execute()
+        response = (
+            supabase.table('companies')
+            .select('opening_cash, safety_threshold, payroll_threshold, forecast_weeks')
+            .eq('id', company_id)
+            .single()
+            .execute()
+        )
         if response.data:
             return response.data
     except:
@@ -318,8 +407,63 @@ def get_company_settings(company_id: str) -> Dict[str, Any]:
 # ==========================================
 # FORECAST ENGINE (13-Week Direct Method)
 # ==========================================
+def _hash_dataframe(df: pd.DataFrame) -> bytes:
+    """Full-content digest for st.cache_data keys on DataFrame arguments"""
+    return pd.util.hash_pandas_object(df, index=True).values.tobytes()
+
+def _week_end_days(dates: pd.Series) -> np.ndarray:
+    """W-MON week-end of each datetime64 date, as days since the epoch (weeks end on Monday)"""
+    days = dates.to_numpy().astype('datetime64[D]').astype(np.int64)
+    return days + (-(days + 3)) % 7  # 1970-01-01 was a Thursday
+
+def get_weekly_base_flows(transactions_df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    Unscaled weekly inflow/outflow totals for a set of transactions
+
+    Computed once per cached snapshot (load_transaction_snapshot), so
+    scenario slider changes only rescale the weekly values.
+
+    Returns:
+        Dict with week_dates, inflow, outflow and payroll_weeks (the
+        week-end dates of weeks that contain a payroll outflow)
+    """
+    if transactions_df.empty:
+        no_dates = np.array([], dtype='datetime64[ns]')
+        return {
+            'week_dates': no_dates,
+            'inflow': np.zeros(0),
+            'outflow': np.zeros(0),
+            'payroll_weeks': no_dates
+        }
+
+    # Loaders guarantee datetime64 dates, so no re-parsing on every scenario change
+    assert np.issubdtype(transactions_df['transaction_date'].dtype, np.datetime64)
+
+    # Bucket each transaction into its week
+    week_end = _week_end_days(transactions_df['transaction_date'])
+    week0 = week_end.min()
+    week = (week_end - week0) // 7
+    n_weeks = int(week.max()) + 1
+
+    amount = transactions_df['amount'].to_numpy(dtype=np.float64)
+    is_inflow = (transactions_df['type'] == 'Inflow').to_numpy()
+    inflow = np.bincount(week[is_inflow], weights=amount[is_inflow], minlength=n_weeks)
+    outflow = np.bincount(week[~is_inflow], weights=amount[~is_inflow], minlength=n_weeks)
+
+    is_payroll = (
+        (transactions_df['category'] == 'Payroll') &
+        (transactions_df['type'] == 'Outflow')
+    ).to_numpy()
+
+    return {
+        'week_dates': (week0 + 7 * np.arange(n_weeks)).astype('datetime64[D]').astype('datetime64[ns]'),
+        'inflow': inflow,
+        'outflow': outflow,
+        'payroll_weeks': np.unique(week_end[is_payroll]).astype('datetime64[D]').astype('datetime64[ns]')
+    }
+
 def calculate_13_week_forecast(
-    transactions_df: pd.DataFrame,
+    weekly_flows: Dict[str, np.ndarray],
     opening_cash: float,
     revenue_confidence: float = 100,
     expense_buffer: float = 100
@@ -328,7 +472,7 @@ def calculate_13_week_forecast(
     Calculate 13-week direct-method cash forecast
 
     Args:
-        transactions_df: Raw transaction data
+        weekly_flows: get_weekly_base_flows() output
         opening_cash: Starting cash balance
         revenue_confidence: % multiplier for inflows (70-110%)
         expense_buffer: % multiplier for outflows (90-150%)
@@ -336,41 +480,23 @@ def calculate_13_week_forecast(
     Returns:
         DataFrame with weekly forecast including Balance, Net, Inflow, Outflow
     """
-    df = transactions_df.copy()
-    df['transaction_date'] = pd.to_datetime(df['transaction_date'])
-
-    # Apply scenario adjustments
-    df.loc[df['type'] == 'Inflow', 'amount'] *= (revenue_confidence / 100)
-    df.loc[df['type'] == 'Outflow', 'amount'] *= (expense_buffer / 100)
-
-    # Group by week and type
-    df_weekly = df.groupby([
-        pd.Grouper(key='transaction_date', freq='W-MON'),
-        'type'
-    ])['amount'].sum().reset_index()
-
-    # Pivot to get Inflow/Outflow columns
-    df_pivot = df_weekly.pivot(
-        index='transaction_date',
-        columns='type',
-        values='amount'
-    ).fillna(0)
-
-    # Ensure columns exist
-    for col in ['Inflow', 'Outflow']:
-        if col not in df_pivot.columns:
-            df_pivot[col] = 0
-
-    # Calculate net flow and running balance
-    df_pivot['Net'] = df_pivot['Inflow'] - df_pivot['Outflow']
-
-    # Calculate cumulative balance
-    df_pivot['Balance'] = opening_cash + df_pivot['Net'].cumsum()
-
-    # Add week number
-    df_pivot['Week'] = range(1, len(df_pivot) + 1)
-
-    return df_pivot.reset_index()
+    columns = ['transaction_date', 'Inflow', 'Outflow', 'Net', 'Balance', 'Week']
+    if weekly_flows['week_dates'].size == 0:
+        return pd.DataFrame(columns=columns)
+
+    # Apply scenario adjustments to the weekly totals
+    inflow = weekly_flows['inflow'] * (revenue_confidence / 100)
+    outflow = weekly_flows['outflow'] * (expense_buffer / 100)
+    net = inflow - outflow
+
+    return pd.DataFrame({
+        'transaction_date': weekly_flows['week_dates'],
+        'Inflow': inflow,
+        'Outflow': outflow,
+        'Net': net,
+        'Balance': opening_cash + np.cumsum(net),
+        'Week': np.arange(1, net.size + 1)
+    }, columns=columns)
 
 # ==========================================
 # SMART KPIs CALCULATION
@@ -379,11 +505,14 @@ def calculate_kpis(
     forecast_df: pd.DataFrame,
     safety_threshold: float,
     payroll_threshold: float,
-    transactions_df: pd.DataFrame
+    payroll_weeks: np.ndarray
 ) -> Dict[str, Any]:
     """
     Calculate all Smart KPIs for executive dashboard
 
+    payroll_weeks are the week-end dates of weeks with a payroll outflow
+    (see get_weekly_base_flows).
+
     Returns dict with:
     - lowest_cash_week, lowest_cash_value
     - weeks_of_runway
@@ -395,47 +524,38 @@ def calculate_kpis(
     """
     kpis = {}
 
+    balance = forecast_df['Balance'].to_numpy(dtype=np.float64)
+    net = forecast_df['Net'].to_numpy(dtype=np.float64)
+    weeks = forecast_df['Week'].to_numpy()
+
     # 1. Lowest cash point
-    min_idx = forecast_df['Balance'].idxmin()
-    kpis['lowest_cash_week'] = int(forecast_df.loc[min_idx, 'Week'])
-    kpis['lowest_cash_value'] = float(forecast_df.loc[min_idx, 'Balance'])
+    min_idx = int(np.argmin(balance))
+    kpis['lowest_cash_week'] = int(weeks[min_idx])
+    kpis['lowest_cash_value'] = float(balance[min_idx])
 
     # 2. Average burn rate (average negative net flow)
-    negative_flows = forecast_df[forecast_df['Net'] < 0]['Net']
-    if len(negative_flows) > 0:
-        kpis['average_burn_rate'] = float(abs(negative_flows.mean()))
-    else:
-        kpis['average_burn_rate'] = 0
+    negative_flows = net[net < 0]
+    kpis['average_burn_rate'] = float(-negative_flows.mean()) if negative_flows.size else 0.0
 
     # 3. Weeks of runway
     if kpis['average_burn_rate'] > 0:
-        current_balance = forecast_df.iloc[0]['Balance']
-        kpis['weeks_of_runway'] = float(current_balance / kpis['average_burn_rate'])
+        kpis['weeks_of_runway'] = float(balance[0] / kpis['average_burn_rate'])
     else:
         kpis['weeks_of_runway'] = 99  # Infinite runway
 
     # 4. Weeks below safety threshold
-    kpis['weeks_below_threshold'] = int((forecast_df['Balance'] < safety_threshold).sum())
+    kpis['weeks_below_threshold'] = int(np.count_nonzero(balance < safety_threshold))
 
     # 5. Payroll risk weeks (weeks with payroll where balance < threshold)
-    payroll_weeks = transactions_df[
-        (transactions_df['category'] == 'Payroll') &
-        (transactions_df['type'] == 'Outflow')
-    ]['transaction_date'].dt.to_period('W-MON').unique()
-
-    risky_weeks = []
-    for week_date in payroll_weeks:
-        week_balance = forecast_df[
-            forecast_df['transaction_date'].dt.to_period('W-MON') == week_date
-        ]
-        if not week_balance.empty and week_balance.iloc[0]['Balance'] < payroll_threshold:
-            risky_weeks.append(week_date)
+    week_dates = forecast_df['transaction_date']
+    risky_mask = week_dates.isin(payroll_weeks) & (forecast_df['Balance'] < payroll_threshold)
+    risky_weeks = week_dates[risky_mask].dt.to_period('W-MON')
 
     kpis['payroll_risk_weeks'] = len(risky_weeks)
-    kpis['payroll_risk_week_list'] = [str(w) for w in risky_weeks]
+    kpis['payroll_risk_week_list'] = risky_weeks.astype(str).tolist()
 
     # 6. Volatility score (std dev of weekly net flows)
-    kpis['volatility_score'] = float(forecast_df['Net'].std())
+    kpis['volatility_score'] = float(net.std(ddof=1)) if net.size > 1 else float('nan')
 
     # Volatility rating
     if kpis['volatility_score'] < 10000:
@@ -454,7 +574,13 @@ def calculate_kpis(
 # ==========================================
 # ANOMALY DETECTION
 # ==========================================
-def detect_anomalies(transactions_df: pd.DataFrame, threshold: float = 20) -> pd.DataFrame:
+# Below this many rows numexpr's setup cost outweighs the fused evaluation
+NUMEXPR_MIN_ROWS = 10_000
+
+def detect_anomalies(
+    transactions_df: pd.DataFrame,
+    threshold: float = 20
+) -> pd.DataFrame:
     """
     Detect anomalies: line items >±20% from historical average
 
@@ -463,32 +589,51 @@ def detect_anomalies(transactions_df: pd.DataFrame, threshold: float = 20) -> pd
         threshold: % deviation threshold (default 20%)
 
     Returns:
-        DataFrame with anomalies
+        DataFrame with anomalies, sorted by % deviation
     """
-    df = transactions_df.copy()
-
-    # Calculate average by category
-    avg_by_category = df.groupby(['category', 'type'])['amount'].mean().reset_index()
-    avg_by_category.columns = ['category', 'type', 'avg_amount']
-
-    # Merge with original data
-    df = df.merge(avg_by_category, on=['category', 'type'], how='left')
+    # Average by category, broadcast back onto each row
+    amount = transactions_df['amount']
+    avg_amount = transactions_df.groupby(['category', 'type'], observed=True)['amount'].transform('mean')
 
     # Calculate % deviation
-    df['pct_deviation'] = ((df['amount'] - df['avg_amount']) / df['avg_amount'] * 100)
+    if NUMEXPR_AVAILABLE and len(transactions_df) >= NUMEXPR_MIN_ROWS:
+        pct_deviation = pd.Series(
+            ne.evaluate(
+                '(amt / avg - 1.0) * 100.0',
+                local_dict={
+                    'amt': amount.to_numpy(dtype=np.float64),
+                    'avg': avg_amount.to_numpy(dtype=np.float64)
+                }
+            ),
+            index=transactions_df.index
+        )
+    else:
+        pct_deviation = (amount / avg_amount - 1.0) * 100.0
 
-    # Flag anomalies
-    df['is_anomaly'] = abs(df['pct_deviation']) > threshold
+    # Materialize only the anomalous rows, not a copy of the whole frame
+    rows = np.flatnonzero((pct_deviation.abs() > threshold).to_numpy())
+
+    anomalies = transactions_df.iloc[rows][['transaction_date', 'category', 'type', 'amount']].assign(
+        avg_amount=avg_amount.iloc[rows].to_numpy(),
+        pct_deviation=pct_deviation.iloc[rows].to_numpy()
+    )
 
-    # Return only anomalies
-    anomalies = df[df['is_anomaly']].copy()
-    anomalies = anomalies.sort_values('pct_deviation', ascending=False)
+    return anomalies.sort_values('pct_deviation', ascending=False)
 
-    return anomalies[['transaction_date', 'category', 'type', 'amount', 'avg_amount', 'pct_deviation']]
+def top_anomalies(anomalies_df: pd.DataFrame, k: int = 10) -> pd.DataFrame:
+    """The k largest anomalies by |% deviation|, largest first"""
+    magnitude = anomalies_df['pct_deviation'].abs().to_numpy()
+    rows = np.arange(magnitude.size)
+    if 0 < k < magnitude.size:
+        # O(n) partial selection of the k largest, then sort just those
+        rows = np.argpartition(-magnitude, k - 1)[:k]
+    rows = rows[np.argsort(-magnitude[rows], kind='stable')][:max(k, 0)]
+    return anomalies_df.iloc[rows]
 
 # ==========================================
 # DATA → PROMPT GROUNDING (CRITICAL)
 # ==========================================
+@st.cache_data(show_spinner=False, max_entries=32, hash_funcs={pd.DataFrame: _hash_dataframe})
 def build_financial_context(forecast_df: pd.DataFrame, kpi_dict: Dict, anomalies_df: pd.DataFrame) -> str:
     """
     CRITICAL: Convert computed results into compact text for LLM
@@ -507,25 +652,39 @@ def build_financial_context(forecast_df: pd.DataFrame, kpi_dict: Dict, anomalies
     # Header
     context_parts.append("=== CASH FORECAST SUMMARY (13 WEEKS) ===\n")
 
-    # Weekly breakdown (highlight key weeks)
+    # Weekly breakdown: key weeks in full, runs of unflagged weeks as one line
     context_parts.append("WEEKLY CASH POSITION:")
-    for _, row in forecast_df.iterrows():
-        week_num = int(row['Week'])
-        net_flow = row['Net']
-        balance = row['Balance']
-
-        # Flag important weeks
-        flags = []
-        if week_num == kpi_dict['lowest_cash_week']:
-            flags.append("LOWEST CASH POINT")
-        if balance < 50000:  # Below typical threshold
-            flags.append("BELOW SAFETY THRESHOLD")
-
-        flag_str = f" ⚠️ {', '.join(flags)}" if flags else ""
-
-        context_parts.append(
-            f"Week {week_num}: Net ${net_flow:,.0f} | Ending Cash ${balance:,.0f}{flag_str}"
-        )
+    weeks = forecast_df['Week'].to_numpy()
+    nets = forecast_df['Net'].to_numpy()
+    balances = forecast_df['Balance'].to_numpy()
+
+    # Flag important weeks
+    is_lowest = weeks == kpi_dict['lowest_cash_week']
+    is_below = balances < 50000  # Below typical threshold
+    flag_strs = {
+        (True, True): " ⚠️ LOWEST CASH POINT, BELOW SAFETY THRESHOLD",
+        (True, False): " ⚠️ LOWEST CASH POINT",
+        (False, True): " ⚠️ BELOW SAFETY THRESHOLD",
+        (False, False): ""
+    }
+
+    keep = is_lowest | is_below
+
+    for kept, run in itertools.groupby(range(len(weeks)), key=lambda i: bool(keep[i])):
+        idx = list(run)
+        if kept or len(idx) == 1:
+            context_parts.extend(
+                f"Week {int(weeks[i])}: Net ${nets[i]:,.0f} | Ending Cash ${balances[i]:,.0f}"
+                f"{flag_strs[(bool(is_lowest[i]), bool(is_below[i]))]}"
+                for i in idx
+            )
+        else:
+            run_slice = slice(idx[0], idx[-1] + 1)
+            context_parts.append(
+                f"Weeks {int(weeks[idx[0]])}-{int(weeks[idx[-1]])}: no flags | "
+                f"Avg Net ${nets[run_slice].mean():,.0f}/wk | "
+                f"Ending Cash ${balances[run_slice].min():,.0f}-${balances[run_slice].max():,.0f}"
+            )
 
     # KPIs
     context_parts.append("\n=== KEY PERFORMANCE INDICATORS ===")
@@ -539,10 +698,10 @@ def build_financial_context(forecast_df: pd.DataFrame, kpi_dict: Dict, anomalies
     # Anomalies
     if len(anomalies_df) > 0:
         context_parts.append("\n=== DETECTED ANOMALIES (>±20% from average) ===")
-        for _, anom in anomalies_df.head(5).iterrows():
+        for anom in anomalies_df.head(5).itertuples(index=False):
             context_parts.append(
-                f"{anom['category']}: ${anom['amount']:,.0f} "
-                f"({anom['pct_deviation']:+.1f}% vs avg ${anom['avg_amount']:,.0f})"
+                f"{anom.category}: ${anom.amount:,.0f} "
+                f"({anom.pct_deviation:+.1f}% vs avg ${anom.avg_amount:,.0f})"
             )
     else:
         context_parts.append("\n=== ANOMALIES ===")
@@ -553,7 +712,19 @@ def build_financial_context(forecast_df: pd.DataFrame, kpi_dict: Dict, anomalies
 # ==========================================
 # AI INSIGHTS (Grounded)
 # ==========================================
-def get_ai_insight(financial_context: str, gemini_api_key: Optional[str] = None) -> str:
+@st.cache_resource(max_entries=1)
+def get_gemini_model(api_key_hash: str, _api_key: str):
+    """
+    Configure Gemini once per API key and reuse the model handle across reruns
+
+    Cached on api_key_hash; the leading underscore keeps the raw key out of
+    Streamlit's cache key.
+    """
+    # genai.configure is process-global, so only the most recent key is kept
+    genai.configure(api_key=_api_key)
+    return genai.GenerativeModel('gemini-pro')
+
+def get_ai_insight(financial_context: str, gemini_api_key: Optional[str] = None) -> Iterator[str]:
     """
     Generate CFO-style insights using Gemini AI
     GROUNDED in computed financial data to prevent hallucinations
@@ -562,18 +733,19 @@ def get_ai_insight(financial_context: str, gemini_api_key: Optional[str] = None)
         financial_context: Output from build_financial_context()
         gemini_api_key: Gemini API key (optional)
 
-    Returns:
-        AI-generated CFO narrative
+    Yields:
+        AI-generated CFO narrative, chunk by chunk as it streams in
     """
     if not GEMINI_AVAILABLE:
-        return "⚠️ AI features require google-generativeai package. Install with: pip install google-generativeai"
+        yield "⚠️ AI features require google-generativeai package. Install with: pip install google-generativeai"
+        return
 
     if not gemini_api_key:
-        return "⚠️ Please provide a Gemini API key in Settings to enable AI insights."
+        yield "⚠️ Please provide a Gemini API key in Settings to enable AI insights."
+        return
 
     try:
-        genai.configure(api_key=gemini_api_key)
-        model = genai.GenerativeModel('gemini-pro')
+        model = get_gemini_model(hashlib.sha256(gemini_api_key.encode()).hexdigest(), gemini_api_key)
 
         prompt = f"""You are a seasoned CFO analyzing a 13-week cash forecast.
 
@@ -605,11 +777,11 @@ Provide a concise CFO Executive Summary with:
 Keep it executive-ready: clear, concise, and action-oriented.
 """
 
-        response = model.generate_content(prompt)
-        return response.text
+        for chunk in model.generate_content(prompt, stream=True):
+            yield chunk.text
 
     except Exception as e:
-        return f"AI Error: {str(e)}\n\nPlease check your API key and try again."
+        yield f"AI Error: {str(e)}\n\nPlease check your API key and try again."
 
 # ==========================================
 # CHAT INTERFACE (Ask the CFO)
@@ -618,7 +790,7 @@ def ask_the_cfo(
     question: str,
     financial_context: str,
     gemini_api_key: Optional[str] = None
-) -> str:
+) -> Iterator[str]:
     """
     Answer user questions about the cash forecast
     Uses grounded financial context to prevent hallucinations
@@ -628,15 +800,15 @@ def ask_the_cfo(
         financial_context: Grounded financial summary
         gemini_api_key: Gemini API key
 
-    Returns:
-        AI answer grounded in data
+    Yields:
+        AI answer grounded in data, chunk by chunk as it streams in
     """
     if not GEMINI_AVAILABLE or not gemini_api_key:
-        return "⚠️ AI chat requires Gemini API key. Please configure in Settings."
+        yield "⚠️ AI chat requires Gemini API key. Please configure in Settings."
+        return
 
     try:
-        genai.configure(api_key=gemini_api_key)
-        model = genai.GenerativeModel('gemini-pro')
+        model = get_gemini_model(hashlib.sha256(gemini_api_key.encode()).hexdigest(), gemini_api_key)
 
         prompt = f"""You are a CFO assistant answering questions about cash flow.
 
@@ -651,11 +823,11 @@ USER QUESTION:
 Provide a clear, concise answer based ONLY on the data above. If you cannot answer from the data provided, explain what information is missing.
 """
 
-        response = model.generate_content(prompt)
-        return response.text
+        for chunk in model.generate_content(prompt, stream=True):
+            yield chunk.text
 
     except Exception as e:
-        return f"Error: {str(e)}"
+        yield f"Error: {str(e)}"
 
 # ==========================================
 # AUTHENTICATION UI
@@ -671,10 +843,11 @@ def show_auth_page():
 
         # Demo mode option
         if st.button("🚀 Try Demo Mode (No Auth)"):
-            st.session_state.demo_mode = True
-            st.session_state.authenticated = True
-            st.session_state.user_role = 'ADMIN'
-            st.session_state.company_id = 'demo'
+            st.session_state.auth = {
+                'demo_mode': True,
+                'user_role': 'ADMIN',
+                'company_id': 'demo'
+            }
             st.rerun()
         return
 
@@ -718,19 +891,324 @@ def show_auth_page():
             else:
                 st.warning("Please fill in all fields")
 
+# ==========================================
+# TABLE RENDERING
+# ==========================================
+TABLE_PREVIEW_ROWS = 50
+
+def render_capped_table(df: pd.DataFrame, formats: Dict[str, str], key: str):
+    """
+    Render a table capped at TABLE_PREVIEW_ROWS rows, with a toggle to show the rest
+
+    Only the rows actually shown are formatted to strings, instead of
+    running a pandas Styler formatter over every cell.
+
+    Args:
+        df: Table to display
+        formats: Column name -> str.format pattern, e.g. {'Net': '${:,.0f}'}
+        key: Unique widget key for the "show all" toggle
+    """
+    show_all = len(df) > TABLE_PREVIEW_ROWS and st.toggle(f"Show all {len(df)} rows", key=key)
+    view = df if show_all else df.head(TABLE_PREVIEW_ROWS)
+    view = view.assign(**{col: view[col].map(fmt.format) for col, fmt in formats.items()})
+
+    st.dataframe(view, use_container_width=True, hide_index=True)
+
+# ==========================================
+# KPI TILES
+# ==========================================
+GREEN, YELLOW, RED = "🟢", "🟡", "🔴"
+VOLATILITY_COLORS = {'Low': GREEN, 'Medium': YELLOW, 'High': RED}
+
+KPI_TILE_HTML = (
+    "<div class='kpi-tile'>"
+    "<div class='kpi-label'>{label}</div>"
+    "<div class='kpi-value'>{value}</div>"
+    "<div class='kpi-delta'>{delta}</div>"
+    "</div>"
+)
+
+def render_kpi_tiles(kpis: Dict[str, Any]):
+    """Render the five executive KPI tiles as one HTML block (a single element instead of five st.metric calls)"""
+    runway = kpis['weeks_of_runway']
+    breaches = kpis['weeks_below_threshold']
+
+    runway_color = GREEN if runway > 10 else YELLOW if runway > 5 else RED
+    breach_color = GREEN if breaches == 0 else YELLOW if breaches < 3 else RED
+    payroll_color = GREEN if kpis['payroll_risk_weeks'] == 0 else RED
+    vol_color = VOLATILITY_COLORS.get(kpis['volatility_rating'], YELLOW)
+
+    tiles = (
+        ("Lowest Cash Point", f"${kpis['lowest_cash_value']:,.0f}", f"Week {kpis['lowest_cash_week']}"),
+        ("Weeks of Runway", f"{runway_color} {runway:.1f}", f"${kpis['average_burn_rate']:,.0f}/wk burn"),
+        ("Weeks Below Threshold", f"{breach_color} {breaches}", "weeks at risk"),
+        ("Payroll Risk Weeks", f"{payroll_color} {kpis['payroll_risk_weeks']}", "high-risk periods"),
+        ("Cash Flow Volatility", f"{vol_color} {kpis['volatility_rating']}", f"σ=${kpis['volatility_score']:,.0f}"),
+    )
+
+    html = "".join(KPI_TILE_HTML.format(label=label, value=value, delta=delta) for label, value, delta in tiles)
+    # Escape "$" so markdown doesn't treat pairs of amounts as LaTeX
+    st.markdown(f"<div class='kpi-row'>{html}</div>".replace("$", "&#36;"), unsafe_allow_html=True)
+
+# ==========================================
+# DASHBOARD CHARTS & PANELS
+# ==========================================
+@st.cache_data(show_spinner=False, max_entries=32)
+def build_balance_figure(
+    weeks: np.ndarray,
+    balances: np.ndarray,
+    safety_threshold: float,
+    lowest_week: int,
+    lowest_value: float
+) -> go.Figure:
+    """Cash balance line with safety threshold and lowest-point marker"""
+    fig_balance = go.Figure()
+
+    # Cash balance line
+    fig_balance.add_trace(go.Scattergl(
+        x=weeks,
+        y=balances,
+        mode='lines+markers',
+        name='Cash Balance',
+        line=dict(color='#00C853', width=3),
+        fill='tozeroy',
+        fillcolor='rgba(0, 200, 83, 0.1)',
+        hovertemplate='Week %{x}<br>Balance: $%{y:,.0f}<extra></extra>'
+    ))
+
+    # Safety threshold line
+    fig_balance.add_hline(
+        y=safety_threshold,
+        line_dash="dash",
+        line_color="red",
+        annotation_text="Safety Threshold",
+        annotation_position="right"
+    )
+
+    # Highlight lowest point
+    fig_balance.add_trace(go.Scattergl(
+        x=[lowest_week],
+        y=[lowest_value],
+        mode='markers',
+        name='Lowest Point',
+        marker=dict(color='red', size=15, symbol='x'),
+        hovertemplate=f'LOWEST: Week {lowest_week}<br>${lowest_value:,.0f}<extra></extra>'
+    ))
+
+    fig_balance.update_layout(
+        title="13-Week Cash Balance Forecast",
+        xaxis_title="Week",
+        yaxis_title="Cash Balance ($)",
+        hovermode="x unified",
+        height=450,
+        showlegend=True
+    )
+
+    return fig_balance
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def build_flows_figure(weeks: np.ndarray, inflows: np.ndarray, outflows: np.ndarray) -> go.Figure:
+    """Grouped weekly inflow vs outflow bars"""
+    fig_flows = go.Figure()
+
+    fig_flows.add_trace(go.Bar(
+        x=weeks,
+        y=inflows,
+        name='Inflows',
+        marker_color='#4CAF50',
+        hovertemplate='Week %{x}<br>Inflows: $%{y:,.0f}<extra></extra>'
+    ))
+
+    fig_flows.add_trace(go.Bar(
+        x=weeks,
+        y=outflows,
+        name='Outflows',
+        marker_color='#F44336',
+        hovertemplate='Week %{x}<br>Outflows: $%{y:,.0f}<extra></extra>'
+    ))
+
+    fig_flows.update_layout(
+        title="Weekly Inflows vs Outflows",
+        xaxis_title="Week",
+        yaxis_title="Amount ($)",
+        barmode='group',
+        hovermode="x unified",
+        height=450
+    )
+
+    return fig_flows
+
+@st.fragment
+def render_balance_tab(forecast_df: pd.DataFrame, safety_threshold: float, kpis: Dict[str, Any]):
+    """Cash balance forecast tab"""
+    lowest_week = kpis['lowest_cash_week']
+    lowest_value = kpis['lowest_cash_value']
+
+    fig_balance = build_balance_figure(
+        forecast_df['Week'].to_numpy(dtype=np.float64),
+        forecast_df['Balance'].to_numpy(dtype=np.float64),
+        safety_threshold,
+        lowest_week,
+        lowest_value
+    )
+    st.plotly_chart(fig_balance, use_container_width=True)
+
+    # Summary below chart
+    if lowest_value < safety_threshold:
+        st.error(f"⚠️ **ALERT**: Cash drops below safety threshold in Week {lowest_week} (${lowest_value:,.0f})")
+    else:
+        st.success("✅ Cash remains above safety threshold throughout the 13-week period")
+
+@st.fragment
+def render_flows_tab(forecast_df: pd.DataFrame):
+    """Inflows vs outflows tab with the net-flow table"""
+    fig_flows = build_flows_figure(
+        forecast_df['Week'].to_numpy(),
+        forecast_df['Inflow'].to_numpy(),
+        forecast_df['Outflow'].to_numpy()
+    )
+    st.plotly_chart(fig_flows, use_container_width=True)
+
+    # Net flow summary
+    st.subheader("Net Cash Flow by Week")
+    net_flow_df = forecast_df[['Week', 'Net']].assign(
+        Status=np.where(forecast_df['Net'].to_numpy() > 0, '✅ Positive', '⚠️ Negative')
+    )
+    render_capped_table(net_flow_df, {'Net': '${:,.0f}'}, key="net_flow_show_all")
+
+@st.fragment
+def render_anomalies_tab(anomalies_df: pd.DataFrame):
+    """Anomaly table and top-deviation chart tab"""
+    st.subheader("🔍 Anomaly Detection")
+    st.caption("Line items >±20% from historical average")
+
+    if len(anomalies_df) > 0:
+        # Display anomalies
+        anomalies_display = anomalies_df.assign(
+            transaction_date=anomalies_df['transaction_date'].dt.strftime('%Y-%m-%d')
+        )
+
+        render_capped_table(anomalies_display, {
+            'amount': '${:,.0f}',
+            'avg_amount': '${:,.0f}',
+            'pct_deviation': '{:+.1f}%'
+        }, key="anomalies_show_all")
+
+        # Anomaly chart
+        fig_anom = px.bar(
+            top_anomalies(anomalies_df, 10),
+            x='category',
+            y='pct_deviation',
+            color='pct_deviation',
+            color_continuous_scale=['red', 'yellow', 'green'],
+            title="Top 10 Anomalies by % Deviation",
+            labels={'pct_deviation': 'Deviation from Average (%)'}
+        )
+        st.plotly_chart(fig_anom, use_container_width=True)
+    else:
+        st.success("✅ No significant anomalies detected")
+
+CHAT_HISTORY_LIMIT = 50
+
+@st.fragment
+def render_ai_panel(
+    forecast_df: pd.DataFrame,
+    kpis: Dict[str, Any],
+    anomalies_df: pd.DataFrame,
+    gemini_api_key: str
+):
+    """AI CFO report and chat; reruns on its own so typing a question leaves the charts alone"""
+    ai_col1, ai_col2 = st.columns([1, 1])
+
+    with ai_col1:
+        st.subheader("🤖 AI CFO Insights")
+
+        if st.button("Generate CFO Report", type="primary", use_container_width=True):
+            if gemini_api_key:
+                with st.spinner("Analyzing financials..."):
+                    # Context is built lazily, only once a prompt actually needs it
+                    financial_context = build_financial_context(forecast_df, kpis, anomalies_df)
+                    insight = st.write_stream(get_ai_insight(financial_context, gemini_api_key))
+
+                    # Save to session for reference
+                    st.session_state.last_insight = insight
+            else:
+                st.warning("⚠️ Please enter Gemini API Key in Settings to enable AI features")
+
+        # Show last insight if available
+        if 'last_insight' in st.session_state:
+            with st.expander("📄 Last Generated Report"):
+                st.markdown(st.session_state.last_insight)
+
+    with ai_col2:
+        st.subheader("💬 Ask the CFO")
+        st.caption("Ask questions about your cash forecast")
+
+        # Initialize chat history
+        if 'chat_history' not in st.session_state:
+            st.session_state.chat_history = []
+
+        # Chat input
+        user_question = st.text_input(
+            "Your question:",
+            placeholder="e.g., What's the lowest cash point this quarter?",
+            key="cfo_question"
+        )
+
+        if st.button("Ask", type="primary", use_container_width=True):
+            if user_question:
+                if gemini_api_key:
+                    with st.spinner("Thinking..."):
+                        financial_context = build_financial_context(forecast_df, kpis, anomalies_df)
+
+                        # Stream the answer live; it is shown from chat history once complete
+                        stream_area = st.empty()
+                        with stream_area.container():
+                            answer = st.write_stream(ask_the_cfo(user_question, financial_context, gemini_api_key))
+                        stream_area.empty()
+
+                        # Add to chat history (bounded, so session state stays small)
+                        st.session_state.chat_history.append({
+                            'question': user_question,
+                            'answer': answer,
+                            'timestamp': datetime.now().isoformat(timespec='minutes')
+                        })
+                        st.session_state.chat_history = st.session_state.chat_history[-CHAT_HISTORY_LIMIT:]
+                else:
+                    st.warning("Please enter Gemini API Key in Settings")
+            else:
+                st.warning("Please enter a question")
+
+        # Display chat history
+        if st.session_state.chat_history:
+            st.divider()
+            recent_chats = st.session_state.chat_history[-1:-6:-1]  # Last 5, newest first
+            for i, chat in enumerate(recent_chats):
+                with st.container():
+                    st.markdown(f"**Q:** {chat['question']}")
+                    st.markdown(f"**A:** {chat['answer']}")
+                    st.caption(f"_{chat['timestamp'].replace('T', ' ')}_")
+                    if i < len(recent_chats) - 1:
+                        st.divider()
+
 # ==========================================
 # MAIN DASHBOARD
 # ==========================================
 def show_dashboard():
     """Main CFO Dashboard Interface"""
 
+    # Read the session once per rerun
+    auth = st.session_state.get('auth', {})
+    company_id = auth.get('company_id', 'demo')
+    user_email = auth.get('user_email', 'Demo User')
+    user_role = auth.get('user_role', 'USER')
+    demo_mode = auth.get('demo_mode', False)
+
     # Sidebar
     with st.sidebar:
         st.header("⚙️ Control Panel")
 
         # User info
-        user_email = st.session_state.get('user_email', 'Demo User')
-        user_role = st.session_state.get('user_role', 'USER')
         st.info(f"👤 {user_email}\n\n🔐 Role: **{user_role}**")
 
         if st.button("🚪 Logout", type="secondary"):
@@ -740,10 +1218,9 @@ def show_dashboard():
         st.divider()
 
         # Settings (Admin only or demo mode)
-        company_id = st.session_state.get('company_id', 'demo')
         settings = get_company_settings(company_id)
 
-        if user_role == 'ADMIN' or st.session_state.get('demo_mode'):
+        if user_role == 'ADMIN' or demo_mode:
             st.subheader("💼 Company Settings")
 
             opening_cash = st.number_input(
@@ -817,13 +1294,13 @@ def show_dashboard():
     st.title("💰 CFO Cash Command Center")
     st.caption("AI-Enabled 13-Week Rolling Cash Forecast")
 
-    # Load data
-    company_id = st.session_state.get('company_id', 'demo')
-    transactions_df = load_transactions(company_id)
+    # Load data (one cached snapshot per company)
+    snapshot = load_transaction_snapshot(company_id)
+    anomalies_df = snapshot['anomalies']
 
     # Calculate forecast
     forecast_df = calculate_13_week_forecast(
-        transactions_df,
+        snapshot,
         opening_cash,
         revenue_confidence,
         expense_buffer
@@ -834,62 +1311,15 @@ def show_dashboard():
         forecast_df,
         safety_threshold,
         payroll_threshold,
-        transactions_df
+        snapshot['payroll_weeks']
     )
 
-    # Detect anomalies
-    anomalies_df = detect_anomalies(transactions_df)
-
-    # Build financial context (for AI)
-    financial_context = build_financial_context(forecast_df, kpis, anomalies_df)
-
     # ==========================================
     # KPI TILES (Top Row)
     # ==========================================
     st.subheader("📊 Executive KPIs")
 
-    col1, col2, col3, col4, col5 = st.columns(5)
-
-    with col1:
-        st.metric(
-            "Lowest Cash Point",
-            f"${kpis['lowest_cash_value']:,.0f}",
-            delta=f"Week {kpis['lowest_cash_week']}",
-            delta_color="inverse"
-        )
-
-    with col2:
-        runway_color = "🟢" if kpis['weeks_of_runway'] > 10 else "🟡" if kpis['weeks_of_runway'] > 5 else "🔴"
-        st.metric(
-            "Weeks of Runway",
-            f"{runway_color} {kpis['weeks_of_runway']:.1f}",
-            delta=f"${kpis['average_burn_rate']:,.0f}/wk burn"
-        )
-
-    with col3:
-        breach_color = "🟢" if kpis['weeks_below_threshold'] == 0 else "🟡" if kpis['weeks_below_threshold'] < 3 else "🔴"
-        st.metric(
-            "Weeks Below Threshold",
-            f"{breach_color} {kpis['weeks_below_threshold']}",
-            delta="weeks at risk"
-        )
-
-    with col4:
-        payroll_color = "🟢" if kpis['payroll_risk_weeks'] == 0 else "🔴"
-        st.metric(
-            "Payroll Risk Weeks",
-            f"{payroll_color} {kpis['payroll_risk_weeks']}",
-            delta="high-risk periods"
-        )
-
-    with col5:
-        volatility_colors = {'Low': '🟢', 'Medium': '🟡', 'High': '🔴'}
-        vol_color = volatility_colors.get(kpis['volatility_rating'], '🟡')
-        st.metric(
-            "Cash Flow Volatility",
-            f"{vol_color} {kpis['volatility_rating']}",
-            delta=f"σ=${kpis['volatility_score']:,.0f}"
-        )
+    render_kpi_tiles(kpis)
 
     st.divider()
 
@@ -903,209 +1333,26 @@ def show_dashboard():
     ])
 
     with chart_tab1:
-        # Main cash balance chart
-        fig_balance = go.Figure()
-
-        # Cash balance line
-        fig_balance.add_trace(go.Scatter(
-            x=forecast_df['Week'],
-            y=forecast_df['Balance'],
-            mode='lines+markers',
-            name='Cash Balance',
-            line=dict(color='#00C853', width=3),
-            fill='tozeroy',
-            fillcolor='rgba(0, 200, 83, 0.1)',
-            hovertemplate='Week %{x}<br>Balance: $%{y:,.0f}<extra></extra>'
-        ))
-
-        # Safety threshold line
-        fig_balance.add_hline(
-            y=safety_threshold,
-            line_dash="dash",
-            line_color="red",
-            annotation_text="Safety Threshold",
-            annotation_position="right"
-        )
-
-        # Highlight lowest point
-        lowest_week = kpis['lowest_cash_week']
-        lowest_value = kpis['lowest_cash_value']
-        fig_balance.add_trace(go.Scatter(
-            x=[lowest_week],
-            y=[lowest_value],
-            mode='markers',
-            name='Lowest Point',
-            marker=dict(color='red', size=15, symbol='x'),
-            hovertemplate=f'LOWEST: Week {lowest_week}<br>${lowest_value:,.0f}<extra></extra>'
-        ))
-
-        fig_balance.update_layout(
-            title="13-Week Cash Balance Forecast",
-            xaxis_title="Week",
-            yaxis_title="Cash Balance ($)",
-            hovermode="x unified",
-            height=450,
-            showlegend=True
-        )
-
-        st.plotly_chart(fig_balance, use_container_width=True)
-
-        # Summary below chart
-        if lowest_value < safety_threshold:
-            st.error(f"⚠️ **ALERT**: Cash drops below safety threshold in Week {lowest_week} (${lowest_value:,.0f})")
-        else:
-            st.success("✅ Cash remains above safety threshold throughout the 13-week period")
+        render_balance_tab(forecast_df, safety_threshold, kpis)
 
     with chart_tab2:
-        # Inflows vs Outflows bar chart
-        fig_flows = go.Figure()
-
-        fig_flows.add_trace(go.Bar(
-            x=forecast_df['Week'],
-            y=forecast_df['Inflow'],
-            name='Inflows',
-            marker_color='#4CAF50',
-            hovertemplate='Week %{x}<br>Inflows: $%{y:,.0f}<extra></extra>'
-        ))
-
-        fig_flows.add_trace(go.Bar(
-            x=forecast_df['Week'],
-            y=forecast_df['Outflow'],
-            name='Outflows',
-            marker_color='#F44336',
-            hovertemplate='Week %{x}<br>Outflows: $%{y:,.0f}<extra></extra>'
-        ))
-
-        fig_flows.update_layout(
-            title="Weekly Inflows vs Outflows",
-            xaxis_title="Week",
-            yaxis_title="Amount ($)",
-            barmode='group',
-            hovermode="x unified",
-            height=450
-        )
-
-        st.plotly_chart(fig_flows, use_container_width=True)
-
-        # Net flow summary
-        st.subheader("Net Cash Flow by Week")
-        net_flow_df = forecast_df[['Week', 'Net']].copy()
-        net_flow_df['Status'] = net_flow_df['Net'].apply(
-            lambda x: '✅ Positive' if x > 0 else '⚠️ Negative'
-        )
-        st.dataframe(
-            net_flow_df.style.format({'Net': '${:,.0f}'}),
-            use_container_width=True,
-            hide_index=True
-        )
+        render_flows_tab(forecast_df)
 
     with chart_tab3:
-        st.subheader("🔍 Anomaly Detection")
-        st.caption("Line items >±20% from historical average")
-
-        if len(anomalies_df) > 0:
-            # Display anomalies
-            anomalies_display = anomalies_df.copy()
-            anomalies_display['transaction_date'] = pd.to_datetime(anomalies_display['transaction_date']).dt.strftime('%Y-%m-%d')
-
-            st.dataframe(
-                anomalies_display.style.format({
-                    'amount': '${:,.0f}',
-                    'avg_amount': '${:,.0f}',
-                    'pct_deviation': '{:+.1f}%'
-                }),
-                use_container_width=True,
-                hide_index=True
-            )
-
-            # Anomaly chart
-            fig_anom = px.bar(
-                anomalies_df.head(10),
-                x='category',
-                y='pct_deviation',
-                color='pct_deviation',
-                color_continuous_scale=['red', 'yellow', 'green'],
-                title="Top 10 Anomalies by % Deviation",
-                labels={'pct_deviation': 'Deviation from Average (%)'}
-            )
-            st.plotly_chart(fig_anom, use_container_width=True)
-        else:
-            st.success("✅ No significant anomalies detected")
+        render_anomalies_tab(anomalies_df)
 
     st.divider()
 
     # ==========================================
     # AI INSIGHTS & CHAT
     # ==========================================
-    ai_col1, ai_col2 = st.columns([1, 1])
-
-    with ai_col1:
-        st.subheader("🤖 AI CFO Insights")
-
-        if st.button("Generate CFO Report", type="primary", use_container_width=True):
-            if gemini_api_key:
-                with st.spinner("Analyzing financials..."):
-                    insight = get_ai_insight(financial_context, gemini_api_key)
-                    st.markdown(insight)
-
-                    # Save to session for reference
-                    st.session_state.last_insight = insight
-            else:
-                st.warning("⚠️ Please enter Gemini API Key in Settings to enable AI features")
-
-        # Show last insight if available
-        if 'last_insight' in st.session_state:
-            with st.expander("📄 Last Generated Report"):
-                st.markdown(st.session_state.last_insight)
-
-    with ai_col2:
-        st.subheader("💬 Ask the CFO")
-        st.caption("Ask questions about your cash forecast")
-
-        # Initialize chat history
-        if 'chat_history' not in st.session_state:
-            st.session_state.chat_history = []
-
-        # Chat input
-        user_question = st.text_input(
-            "Your question:",
-            placeholder="e.g., What's the lowest cash point this quarter?",
-            key="cfo_question"
-        )
-
-        if st.button("Ask", type="primary", use_container_width=True):
-            if user_question:
-                if gemini_api_key:
-                    with st.spinner("Thinking..."):
-                        answer = ask_the_cfo(user_question, financial_context, gemini_api_key)
-
-                        # Add to chat history
-                        st.session_state.chat_history.append({
-                            'question': user_question,
-                            'answer': answer,
-                            'timestamp': datetime.now()
-                        })
-                else:
-                    st.warning("Please enter Gemini API Key in Settings")
-            else:
-                st.warning("Please enter a question")
-
-        # Display chat history
-        if st.session_state.chat_history:
-            st.divider()
-            for i, chat in enumerate(reversed(st.session_state.chat_history[-5:])):
-                with st.container():
-                    st.markdown(f"**Q:** {chat['question']}")
-                    st.markdown(f"**A:** {chat['answer']}")
-                    st.caption(f"_{chat['timestamp'].strftime('%Y-%m-%d %H:%M')}_")
-                    if i < len(st.session_state.chat_history) - 1:
-                        st.divider()
+    render_ai_panel(forecast_df, kpis, anomalies_df, gemini_api_key)
 
     # ==========================================
     # DEBUG PANEL (for developers)
     # ==========================================
-    with st.expander("🔧 Debug: Financial Context (AI Input)"):
-        st.code(financial_context, language="text")
+    if st.toggle("🔧 Debug: Show Financial Context (AI Input)"):
+        st.code(build_financial_context(forecast_df, kpis, anomalies_df), language="text")
         st.caption("This is the exact data sent to the AI model to prevent hallucinations")
 
 # ==========================================
@@ -1114,12 +1361,8 @@ def show_dashboard():
 def main():
     """Main application entry point"""
 
-    # Initialize session state
-    if 'authenticated' not in st.session_state:
-        st.session_state.authenticated = False
-
     # Route to appropriate page
-    if st.session_state.authenticated:
+    if 'auth' in st.session_state:
         show_dashboard()
     else:
         show_auth_page()
@@ -0,0 +1,29 @@
+-- Column-oriented bulk insert for transactions
+-- Clients send one array per column (struct-of-arrays) instead of one JSON object per row,
+-- which keeps the request body small and avoids per-row key repetition when seeding data.
+-- Runs with the caller's privileges, so the existing RLS insert policy on transactions applies.
+
+CREATE OR REPLACE FUNCTION bulk_insert_transactions(
+    p_company_id UUID,
+    p_transaction_date DATE[],
+    p_category TEXT[],
+    p_type TEXT[],
+    p_amount NUMERIC[],
+    p_description TEXT[]
+)
+RETURNS INTEGER AS $$
+DECLARE
+    inserted_count INTEGER;
+BEGIN
+    INSERT INTO public.transactions (company_id, transaction_date, category, type, amount, description)
+    SELECT p_company_id, t.transaction_date, t.category, t.type, t.amount, t.description
+    FROM unnest(p_transaction_date, p_category, p_type, p_amount, p_description)
+        AS t(transaction_date, category, type, amount, description);
+
+    GET DIAGNOSTICS inserted_count = ROW_COUNT;
+    RETURN inserted_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Add comment to explain the function
+COMMENT ON FUNCTION bulk_insert_transactions IS 'Insert many transactions for one company from parallel column arrays. Used by the Streamlit app to seed default data.';